@@ -305,7 +305,7 @@ class BaseAviary(BenchmarkEnv):
                     self._downwash(i)
                 # Apply disturbance
                 if disturbance_force is not None:
-                    pos = self._get_drone_state_vector(i)[:3]
+                    pos = self.pos[i, :]
                     p.applyExternalForce(
                         self.DRONE_IDS[i],
                         linkIndex=4,  # Link attached to the quadrotor's center of mass.
@@ -8,7 +8,8 @@ Based on UTIAS Dynamic Systems Lab's gym-pybullet-drones:
 import os
 import logging
 import math
-from copy import deepcopy
+import threading
+from copy import copy, deepcopy
 import casadi as cs
 from gym import spaces
 import numpy as np
@@ -18,12 +19,87 @@ from safe_control_gym.envs.benchmark_env import Cost, Task
 from safe_control_gym.envs.constraints import GENERAL_CONSTRAINTS
 from safe_control_gym.math_and_models.symbolic_systems import SymbolicModel
 from safe_control_gym.envs.gym_pybullet_drones.base_aviary import BaseAviary
-from safe_control_gym.envs.gym_pybullet_drones.quadrotor_utils import QuadType, cmd2pwm, pwm2rpm
-from safe_control_gym.math_and_models.transformations import transform_trajectory, csRotXYZ
+from safe_control_gym.envs.gym_pybullet_drones.quadrotor_utils import QuadType
+from safe_control_gym.math_and_models.transformations import (
+    transform_trajectory,
+    quaternion_from_euler,
+)
 from munch import munchify
 
 logger = logging.getLogger(__name__)
 
+# Symbolic models shared by all instances with the same nominal parameters, see _setup_symbolic().
+_SYM_CACHE: dict = {}
+_SYM_CACHE_LOCK = threading.Lock()
+_CASADI_VERSION = tuple(int(v) for v in cs.__version__.split(".")[:2])
+# Common subexpression elimination requires CasADi >= 3.6.
+_CASADI_HAS_CSE = _CASADI_VERSION >= (3, 6)
+# Compiling jit binaries into a chosen directory, which the on-disk cache of jit compiled functions
+# relies on (older versions write them to the working directory), requires CasADi >= 3.6.
+_CASADI_HAS_JIT_DIR = _CASADI_VERSION >= (3, 6)
+_SYM_JIT_OPTS = {
+    "jit": True,
+    "compiler": "shell",
+    "jit_options": {"flags": ["-O3", "-march=native"]},
+}
+_SYM_JIT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "safe_control_gym")
+# Bound of the unbounded state components (velocities, body rates) of the observation space.
+_F32_MAX = float(np.finfo(np.float32).max)
+# Index of each initial state component in the stacked [xyz, vel, rpy, ang_vel] vector of reset().
+_INIT_STATE_FULL_IDX = {
+    "init_x": 0,
+    "init_y": 1,
+    "init_z": 2,
+    "init_x_dot": 3,
+    "init_y_dot": 4,
+    "init_z_dot": 5,
+    "init_phi": 6,
+    "init_theta": 7,
+    "init_psi": 8,
+    "init_p": 9,
+    "init_q": 10,
+    "init_theta_dot": 10,  # Only used in 2D quad.
+    "init_r": 11,
+}
+
+
+def _pack_state_1d(pos, quat, rpy, vel, ang_v):
+    """Packs the 1D quadrotor state {z, z_dot} from the drone kinematics."""
+    return np.array([pos[2], vel[2]])
+
+
+def _pack_state_2d(pos, quat, rpy, vel, ang_v):
+    """Packs the 2D quadrotor state {x, x_dot, z, z_dot, theta, theta_dot}."""
+    return np.array([pos[0], vel[0], pos[2], vel[2], rpy[1], ang_v[1]])
+
+
+def _pack_state_3d(pos, quat, rpy, vel, ang_v):
+    """Packs the 3D quadrotor state {x, x_dot, y, y_dot, z, z_dot, phi, theta, psi, p, q, r}.
+
+    The angular velocity is rotated from the world to the body frame.
+    """
+    state = np.empty(12)
+    state[0:6:2] = pos
+    state[1:6:2] = vel
+    state[6:9] = rpy
+    # Rotation by the conjugate quaternion, v' = v + w * t - u x t with t = -2 * u x v.
+    x, y, z, w = quat.tolist()
+    vx, vy, vz = ang_v.tolist()
+    tx = 2.0 * (z * vy - y * vz)
+    ty = 2.0 * (x * vz - z * vx)
+    tz = 2.0 * (y * vx - x * vy)
+    state[9] = vx + w * tx - (y * tz - z * ty)
+    state[10] = vy + w * ty - (z * tx - x * tz)
+    state[11] = vz + w * tz - (x * ty - y * tx)
+    return state
+
+
+_PACK_STATE = {
+    QuadType.ONE_D: _pack_state_1d,
+    QuadType.TWO_D: _pack_state_2d,
+    QuadType.THREE_D: _pack_state_3d,
+}
+
 
 class Quadrotor(BaseAviary):
     """1D and 2D quadrotor environment task.
@@ -113,6 +189,7 @@ class Quadrotor(BaseAviary):
         rew_exponential=True,
         done_on_out_of_bound=True,
         info_mse_metric_state_weight=None,
+        symbolic_jit=False,
         **kwargs,
     ):
         """Initialize a quadrotor environment.
@@ -128,16 +205,27 @@ class Quadrotor(BaseAviary):
             rew_exponential (bool): if to exponentiate negative quadratic cost to positive, bounded [0,1] reward.
             done_on_out_of_bound (bool): if to termiante when state is out of bound.
             info_mse_metric_state_weight (list/ndarray): quadratic weights for state in mse calculation for info dict.
+            symbolic_jit (bool): if to jit compile the functions of the symbolic model
+                (requires a C compiler).
 
         """
         # Select the 1D (moving along z) or 2D (moving in the xz plane) quadrotor.
         self.QUAD_TYPE = QuadType(quad_type)
+        # Packing of the state specialized to the quadrotor type, used by every step.
+        self._pack_state = _PACK_STATE[self.QUAD_TYPE]
+        self._is_3d = self.QUAD_TYPE == QuadType.THREE_D
         self.norm_act_scale = norm_act_scale
         self.obs_goal_horizon = obs_goal_horizon
         self.rew_state_weight = np.array(rew_state_weight, ndmin=1, dtype=float)
         self.rew_act_weight = np.array(rew_act_weight, ndmin=1, dtype=float)
         self.rew_exponential = rew_exponential
         self.done_on_out_of_bound = done_on_out_of_bound
+        if symbolic_jit and not _CASADI_HAS_JIT_DIR:
+            raise ValueError(
+                f"[ERROR] in Quadrotor.__init__(), symbolic_jit requires CasADi >= 3.6, found"
+                f" {cs.__version__}."
+            )
+        self.SYMBOLIC_JIT = symbolic_jit
         if info_mse_metric_state_weight is None:
             if self.QUAD_TYPE == QuadType.ONE_D:
                 self.info_mse_metric_state_weight = np.array([1, 0], ndmin=1, dtype=float)
@@ -162,6 +250,8 @@ class Quadrotor(BaseAviary):
                 )
             else:
                 raise ValueError("Wrong info_mse_metric_state_weight argument size.")
+        # The mse weights apply to the state error before squaring, fold them into one factor.
+        self._info_mse_weight_sq = self.info_mse_metric_state_weight**2
 
         # BaseAviary constructor, called after defining the custom args,
         # since some BenchmarkEnv init setup can be task(custom args)-dependent.
@@ -193,18 +283,24 @@ class Quadrotor(BaseAviary):
                 "init_r",
             ],
         }
-        if init_state is None:
-            for init_name in self.INIT_STATE_RAND_INFO:  # Default zero state.
-                self.__dict__[init_name.upper()] = 0.0
+        # Nominal initial state as an array ordered as INIT_STATE_LABELS.
+        init_labels = self.INIT_STATE_LABELS[self.QUAD_TYPE]
+        if init_state is None:  # Default zero state.
+            self._init_nominal = np.zeros(len(init_labels))
+        elif isinstance(init_state, np.ndarray):  # Full state as numpy array .
+            if len(init_state) < len(init_labels):
+                raise ValueError(
+                    f"[ERROR] in Quadrotor.__init__(), init_state has {len(init_state)} elements,"
+                    f" expected {len(init_labels)} ({', '.join(init_labels)})."
+                )
+            # Copied, not to alias the caller's array.
+            self._init_nominal = np.asarray(init_state, dtype=float)[: len(init_labels)].copy()
+        elif isinstance(init_state, dict):  # Partial state as dictionary.
+            self._init_nominal = np.array(
+                [init_state.get(init_name, 0.0) for init_name in init_labels], dtype=float
+            )
         else:
-            if isinstance(init_state, np.ndarray):  # Full state as numpy array .
-                for i, init_name in enumerate(self.INIT_STATE_LABELS[self.QUAD_TYPE]):
-                    self.__dict__[init_name.upper()] = init_state[i]
-            elif isinstance(init_state, dict):  # Partial state as dictionary.
-                for init_name in self.INIT_STATE_LABELS[self.QUAD_TYPE]:
-                    self.__dict__[init_name.upper()] = init_state.get(init_name, 0.0)
-            else:
-                raise ValueError("[ERROR] in Quadrotor.__init__(), init_state incorrect format.")
+            raise ValueError("[ERROR] in Quadrotor.__init__(), init_state incorrect format.")
 
         # Remove randomization info of initial state components inconsistent with quad type.
         for init_name in list(self.INIT_STATE_RAND_INFO.keys()):
@@ -220,6 +316,11 @@ class Quadrotor(BaseAviary):
             # Only randomize Iyy for the 2D quadrotor.
             self.INERTIAL_PROP_RAND_INFO.pop("Ixx", None)
             self.INERTIAL_PROP_RAND_INFO.pop("Izz", None)
+        # Where to place the initial state components in the stacked [xyz, vel, rpy, ang_vel]
+        # vector of reset().
+        self._init_full_idx = np.array([_INIT_STATE_FULL_IDX[name] for name in init_labels])
+        self._nominal_init_kinematics = self._init_kinematics(self._init_nominal)
+        self._setup_init_state_randomization()
 
         # Override inertial properties of passed as arguments.
         if inertial_prop is None:
@@ -237,45 +338,39 @@ class Quadrotor(BaseAviary):
             self.J[2, 2] = inertial_prop.get("Izz", self.J[2, 2])
         else:
             raise ValueError("[ERROR] in Quadrotor.__init__(), inertial_prop incorrect format.")
+        # Nominal inertia, used as is by reset() when inertial properties are not randomized.
+        self._nominal_inertia = [self.J[0, 0], self.J[1, 1], self.J[2, 2]]
 
         # Set prior/symbolic info.
         self._setup_symbolic()
+        # The reward only depends on the (fixed) cost type, select its function once.
+        self._get_reward = {
+            Cost.RL_REWARD: self._get_rl_reward,
+            Cost.QUADRATIC: self._get_quadratic_reward,
+            Cost.COMPETITION: self._get_competition_reward,
+        }[self.COST]
+        # Fixed part of the reset info, built by the first reset, see _get_reset_info().
+        self._reset_info_constants = None
+        if self.COST == Cost.QUADRATIC:
+            # Only the cost itself is evaluated per step, not the derivatives of the full loss.
+            self._loss_func = self.symbolic.loss.factory(
+                "l", ["x", "u", "Xr", "Ur", "Q", "R"], ["l"]
+            )
 
         # Create X_GOAL and U_GOAL references for the assigned task.
-        self.U_GOAL = np.ones(self.action_dim) * self.MASS * self.GRAVITY_ACC / self.action_dim
+        self.U_GOAL = np.full(self.action_dim, self.MASS * self.GRAVITY_ACC / self.action_dim)
         if self.TASK == Task.STABILIZATION:
+            # Fill the position entries of the goal, velocities, attitude and rates stay zero.
+            self.X_GOAL = np.zeros(self.state_dim)
             if self.QUAD_TYPE == QuadType.ONE_D:
-                self.X_GOAL = np.hstack(
-                    [self.TASK_INFO["stabilization_goal"][1], 0.0]
-                )  # x = {z, z_dot}.
+                # x = {z, z_dot}.
+                self.X_GOAL[0] = self.TASK_INFO["stabilization_goal"][1]
             elif self.QUAD_TYPE == QuadType.TWO_D:
-                self.X_GOAL = np.hstack(
-                    [
-                        self.TASK_INFO["stabilization_goal"][0],
-                        0.0,
-                        self.TASK_INFO["stabilization_goal"][1],
-                        0.0,
-                        0.0,
-                        0.0,
-                    ]
-                )  # x = {x, x_dot, z, z_dot, theta, theta_dot}.
+                # x = {x, x_dot, z, z_dot, theta, theta_dot}.
+                self.X_GOAL[0:4:2] = self.TASK_INFO["stabilization_goal"][0:2]
             elif self.QUAD_TYPE == QuadType.THREE_D:
-                self.X_GOAL = np.hstack(
-                    [
-                        self.TASK_INFO["stabilization_goal"][0],
-                        0.0,
-                        self.TASK_INFO["stabilization_goal"][1],
-                        0.0,
-                        self.TASK_INFO["stabilization_goal"][2],
-                        0.0,
-                        0.0,
-                        0.0,
-                        0.0,
-                        0.0,
-                        0.0,
-                        0.0,
-                    ]
-                )  # x = {x, x_dot, y, y_dot, z, z_dot, phi, theta, psi, p, q, r}.
+                # x = {x, x_dot, y, y_dot, z, z_dot, phi, theta, psi, p, q, r}.
+                self.X_GOAL[0:6:2] = self.TASK_INFO["stabilization_goal"][0:3]
         elif self.TASK == Task.TRAJ_TRACKING:
             POS_REF, VEL_REF, SPEED = self._generate_trajectory(
                 traj_type=self.TASK_INFO["trajectory_type"],
@@ -286,24 +381,16 @@ class Quadrotor(BaseAviary):
                 scaling=self.TASK_INFO["trajectory_scale"],
                 sample_time=self.CTRL_TIMESTEP,
             )  # Each of the 3 returned values is of shape (Ctrl timesteps, 3)
+            # Fill the position and velocity columns of the goal, attitude and rates stay zero.
+            self.X_GOAL = np.zeros((POS_REF.shape[0], self.state_dim))
             if self.QUAD_TYPE == QuadType.ONE_D:
-                self.X_GOAL = np.vstack(
-                    [
-                        POS_REF[:, 2],  # z
-                        VEL_REF[:, 2],  # z_dot
-                    ]
-                ).transpose()
+                # x = {z, z_dot}.
+                self.X_GOAL[:, 0] = POS_REF[:, 2]
+                self.X_GOAL[:, 1] = VEL_REF[:, 2]
             elif self.QUAD_TYPE == QuadType.TWO_D:
-                self.X_GOAL = np.vstack(
-                    [
-                        POS_REF[:, 0],  # x
-                        VEL_REF[:, 0],  # x_dot
-                        POS_REF[:, 2],  # z
-                        VEL_REF[:, 2],  # z_dot
-                        np.zeros(POS_REF.shape[0]),  # zeros
-                        np.zeros(VEL_REF.shape[0]),
-                    ]
-                ).transpose()
+                # x = {x, x_dot, z, z_dot, theta, theta_dot}.
+                self.X_GOAL[:, 0:4:2] = POS_REF[:, 0:3:2]
+                self.X_GOAL[:, 1:4:2] = VEL_REF[:, 0:3:2]
             elif self.QUAD_TYPE == QuadType.THREE_D:
                 # Additional transformation of the originally planar trajectory.
                 POS_REF_TRANS, VEL_REF_TRANS = transform_trajectory(
@@ -314,22 +401,9 @@ class Quadrotor(BaseAviary):
                         "normal": self.TASK_INFO["proj_normal"],
                     },
                 )
-                self.X_GOAL = np.vstack(
-                    [
-                        POS_REF_TRANS[:, 0],  # x
-                        VEL_REF_TRANS[:, 0],  # x_dot
-                        POS_REF_TRANS[:, 1],  # y
-                        VEL_REF_TRANS[:, 1],  # y_dot
-                        POS_REF_TRANS[:, 2],  # z
-                        VEL_REF_TRANS[:, 2],  # z_dot
-                        np.zeros(POS_REF_TRANS.shape[0]),  # zeros
-                        np.zeros(POS_REF_TRANS.shape[0]),
-                        np.zeros(POS_REF_TRANS.shape[0]),
-                        np.zeros(VEL_REF_TRANS.shape[0]),
-                        np.zeros(VEL_REF_TRANS.shape[0]),
-                        np.zeros(VEL_REF_TRANS.shape[0]),
-                    ]
-                ).transpose()
+                # x = {x, x_dot, y, y_dot, z, z_dot, phi, theta, psi, p, q, r}.
+                self.X_GOAL[:, 0:6:2] = POS_REF_TRANS
+                self.X_GOAL[:, 1:6:2] = VEL_REF_TRANS
 
         # Equilibrium point at hover for linearization.
         self.X_EQ = np.zeros(self.state_dim)
@@ -344,8 +418,32 @@ class Quadrotor(BaseAviary):
         if "gates" in kwargs:
             self.GATES = kwargs["gates"]
         self.GATES = np.array(self.GATES)
+        # Keep empty mazes 2D, i.e. (0, 6) obstacles and (0, 7) gates, so they can be sliced.
+        if self.OBSTACLES.size == 0:
+            self.OBSTACLES = np.empty((0, 6))
+        if self.GATES.size == 0:
+            self.GATES = np.empty((0, 7))
         self.NUM_GATES = len(self.GATES)
         self.n_obstacles = len(self.OBSTACLES)
+        # Nominal maze poses and gate types as float arrays, reused by every reset().
+        self._obstacle_xyz = self.OBSTACLES[:, 0:3].astype(np.float64)
+        self._obstacle_rpy = self.OBSTACLES[:, 3:6].astype(np.float64)
+        self._gate_xyz = self.GATES[:, 0:3].astype(np.float64)
+        self._gate_rpy = self.GATES[:, 3:6].astype(np.float64)
+        self._gate_type = self.GATES[:, 6].astype(np.int32)
+        if not np.isin(self._gate_type, [0, 1]).all():
+            raise ValueError("[ERROR] Unknown gate type.")
+        # URDF dependent height of each gate, and the nominal maze poses reported by _get_info().
+        self._gate_z = np.where(self._gate_type == 0, self.GATE_Z_HIGH, self.GATE_Z_LOW)
+        self._gates_pose_nominal = self.GATES[:, :6].astype(np.float64)
+        self._gates_pose_nominal[:, 2] = self._gate_z
+        self._obstacles_pose_nominal = self.OBSTACLES.astype(np.float64)
+        self._obstacles_pose_nominal[:, 2] = self.OBSTACLE_Z
+        # Vertical rays through the current gate (center, then alternating sides along its axis),
+        # refilled in place by _get_info() to detect the drone stepping through.
+        self._gate_ray_steps = np.array([0.0, 1.0, -1.0, 2.0, -2.0, 3.0, -3.0])
+        self._gate_ray_from = np.empty((len(self._gate_ray_steps), 3))
+        self._gate_ray_to = np.empty((len(self._gate_ray_steps), 3))
         if kwargs.get("randomized_gates_and_obstacles", False):
             self.RANDOMIZED_GATES_AND_OBS = True
             if "gates_and_obstacles_randomization_info" not in kwargs:
@@ -353,6 +451,7 @@ class Quadrotor(BaseAviary):
                     "Missing 'gates_and_obstacles_randomization_info' in YAML configuration."
                 )
             self.GATES_AND_OBS_RAND_INFO = kwargs["gates_and_obstacles_randomization_info"]
+            self._setup_gates_and_obstacles_randomization()
         else:
             self.RANDOMIZED_GATES_AND_OBS = False
         #
@@ -390,91 +489,86 @@ class Quadrotor(BaseAviary):
         super()._reset_simulation()
 
         # IROS 2022 - Create maze.
-        self.OBSTACLES_IDS = []
-        self.obstacle_poses = []
+        if self.GUI:
+            # Defer GUI rendering until all bodies of the maze are loaded.
+            p.configureDebugVisualizer(p.COV_ENABLE_RENDERING, 0, physicsClientId=self.PYB_CLIENT)
+        obs_height = 0.525  # URDF dependent, places 'obstacle.urdf' at z == 0.
+        offsets = np.zeros((self.n_obstacles, 3))
+        offsets[:, 2] = obs_height
+        pose_disturbances = np.zeros((self.n_obstacles, 3))
         if self.RANDOMIZED_GATES_AND_OBS:
-            rand_info_copy = deepcopy(self.GATES_AND_OBS_RAND_INFO)
-            distrib = getattr(self.np_random, rand_info_copy["obstacles"].pop("distrib"))
-            d_args = rand_info_copy["obstacles"].pop("args", [])
-            d_kwargs = rand_info_copy["obstacles"]
-        for obstacle in self.OBSTACLES:
-            obs_height = 0.525  # URDF dependent, places 'obstacle.urdf' at z == 0.
-            if self.RANDOMIZED_GATES_AND_OBS:
-                offset = np.array(
-                    [distrib(*d_args, **d_kwargs), distrib(*d_args, **d_kwargs), obs_height]
-                )
-                pose_disturbance = np.array([0, 0, distrib(*d_args, **d_kwargs)])
-            else:
-                offset = np.array([0, 0, obs_height])
-                pose_disturbance = np.array([0, 0, 0])
-            self.obstacle_poses.append(
-                list(np.array(obstacle[0:3]) + offset)
-                + list(np.array(obstacle[3:6]) + pose_disturbance)
-            )
+            distrib_name, d_args, d_kwargs = self._gates_and_obs_rand["obstacles"]
+            distrib = getattr(self.np_random, distrib_name)
+            # Draw (x, y, yaw) for all obstacles at once, in the order of the per-obstacle draws.
+            samples = distrib(*d_args, size=(self.n_obstacles, 3), **d_kwargs)
+            offsets[:, :2] = samples[:, :2]
+            pose_disturbances[:, 2] = samples[:, 2]
+        self.obstacle_poses = np.empty((self.n_obstacles, 6))
+        np.add(self._obstacle_xyz, offsets, out=self.obstacle_poses[:, 0:3])
+        np.add(self._obstacle_rpy, pose_disturbances, out=self.obstacle_poses[:, 3:6])
+        obstacle_quats = quaternion_from_euler(self.obstacle_poses[:, 3:6])
+        self.OBSTACLES_IDS = []
+        for obstacle_pose, obstacle_quat in zip(self.obstacle_poses, obstacle_quats):
             TMP_ID = p.loadURDF(
                 os.path.join(self.URDF_DIR, "obstacle.urdf"),
-                np.array(obstacle[0:3]) + offset,
-                p.getQuaternionFromEuler(np.array(obstacle[3:6]) + pose_disturbance),
-                physicsClientId=self.PYB_CLIENT,
-            )
-            p.addUserDebugText(
-                str(TMP_ID),
-                textPosition=[0, 0, 0.5],
-                textColorRGB=[1, 0, 0],
-                lifeTime=self.EPISODE_LEN_SEC,
-                textSize=1.5,
-                parentObjectUniqueId=TMP_ID,
-                parentLinkIndex=-1,
+                obstacle_pose[0:3],
+                obstacle_quat,
+                flags=p.URDF_ENABLE_CACHED_GRAPHICS_SHAPES,
                 physicsClientId=self.PYB_CLIENT,
             )
+            if self.GUI:
+                p.addUserDebugText(
+                    str(TMP_ID),
+                    textPosition=[0, 0, 0.5],
+                    textColorRGB=[1, 0, 0],
+                    lifeTime=self.EPISODE_LEN_SEC,
+                    textSize=1.5,
+                    parentObjectUniqueId=TMP_ID,
+                    parentLinkIndex=-1,
+                    physicsClientId=self.PYB_CLIENT,
+                )
             self.OBSTACLES_IDS.append(TMP_ID)
-        self.obstacle_poses = np.array(self.obstacle_poses)
         self.obstacle_poses[:, 2] = self.OBSTACLE_Z
-        self.GATES_IDS = []
-        self._gates_pose = []
+        # URDF dependent, places 'portal.urdf' and 'low_portal.urdf' at z == 0.
+        offsets = np.zeros((self.NUM_GATES, 3))
+        offsets[:, 2] = self._gate_z
+        pose_disturbances = np.zeros((self.NUM_GATES, 3))
         if self.RANDOMIZED_GATES_AND_OBS:
-            rand_info_copy = deepcopy(self.GATES_AND_OBS_RAND_INFO)
-            distrib = getattr(self.np_random, rand_info_copy["gates"].pop("distrib"))
-            d_args = rand_info_copy["gates"].pop("args", [])
-            d_kwargs = rand_info_copy["gates"]
-        for gate in self.GATES:
-            if gate[6] == 0:
-                urdf_file = "portal.urdf"
-                gate_height = self.GATE_Z_HIGH  # URDF dependent, places 'portal.urdf' at z == 0.
-            elif gate[6] == 1:
-                urdf_file = "low_portal.urdf"
-                gate_height = self.GATE_Z_LOW  # URDF dependent, places 'low_portal.urdf' at z == 0.
-            else:
-                raise ValueError("[ERROR] Unknown gate type.")
-            if self.RANDOMIZED_GATES_AND_OBS:
-                offset = np.array(
-                    [distrib(*d_args, **d_kwargs), distrib(*d_args, **d_kwargs), gate_height]
-                )
-                pose_disturbance = np.array([0, 0, distrib(*d_args, **d_kwargs)])
-            else:
-                offset = np.array([0, 0, gate_height])
-                pose_disturbance = np.array([0, 0, 0])
-            self._gates_pose.append(
-                list(np.array(gate[0:3]) + offset) + list(np.array(gate[3:6]) + pose_disturbance)
-            )
+            distrib_name, d_args, d_kwargs = self._gates_and_obs_rand["gates"]
+            distrib = getattr(self.np_random, distrib_name)
+            samples = distrib(*d_args, size=(self.NUM_GATES, 3), **d_kwargs)
+            offsets[:, :2] = samples[:, :2]
+            pose_disturbances[:, 2] = samples[:, 2]
+        self._gates_pose = np.empty((self.NUM_GATES, 6))
+        np.add(self._gate_xyz, offsets, out=self._gates_pose[:, 0:3])
+        np.add(self._gate_rpy, pose_disturbances, out=self._gates_pose[:, 3:6])
+        gate_quats = quaternion_from_euler(self._gates_pose[:, 3:6])
+        self.GATES_IDS = []
+        for gate_type, gate_pose, gate_quat in zip(self._gate_type, self._gates_pose, gate_quats):
+            urdf_file = "portal.urdf" if gate_type == 0 else "low_portal.urdf"
             TMP_ID = p.loadURDF(
                 os.path.join(self.URDF_DIR, urdf_file),
-                np.array(gate[0:3]) + offset,
-                p.getQuaternionFromEuler(np.array(gate[3:6]) + pose_disturbance),
-                physicsClientId=self.PYB_CLIENT,
-            )
-            p.addUserDebugText(
-                str(TMP_ID),
-                textPosition=[0, 0, 0.5],
-                textColorRGB=[1, 0, 0],
-                lifeTime=self.EPISODE_LEN_SEC,
-                textSize=1.5,
-                parentObjectUniqueId=TMP_ID,
-                parentLinkIndex=-1,
+                gate_pose[0:3],
+                gate_quat,
+                flags=p.URDF_ENABLE_CACHED_GRAPHICS_SHAPES,
                 physicsClientId=self.PYB_CLIENT,
             )
+            if self.GUI:
+                p.addUserDebugText(
+                    str(TMP_ID),
+                    textPosition=[0, 0, 0.5],
+                    textColorRGB=[1, 0, 0],
+                    lifeTime=self.EPISODE_LEN_SEC,
+                    textSize=1.5,
+                    parentObjectUniqueId=TMP_ID,
+                    parentLinkIndex=-1,
+                    physicsClientId=self.PYB_CLIENT,
+                )
             self.GATES_IDS.append(TMP_ID)
-        self._gates_pose = np.array(self._gates_pose)
+        # Bodies checked for collisions with the drone, in the order they are reported.
+        self._collision_ids = self.GATES_IDS + self.OBSTACLES_IDS + [self.PLANE_ID]
+        if self.GUI:
+            p.configureDebugVisualizer(p.COV_ENABLE_RENDERING, 1, physicsClientId=self.PYB_CLIENT)
         
         if kwargs.get("initial_target_gate_id", None) is not None:
             #logger.info(f"Resett provided custom gate start id: {kwargs['initial_target_gate_id']}")
@@ -498,20 +592,27 @@ class Quadrotor(BaseAviary):
         self.task_completed = False
 
         # Choose randomized or deterministic inertial properties.
-        prop_values = {
-            "M": self.MASS,
-            "Ixx": self.J[0, 0],
-            "Iyy": self.J[1, 1],
-            "Izz": self.J[2, 2],
-        }
         if self.RANDOMIZED_INERTIAL_PROP:
+            prop_values = {
+                "M": self.MASS,
+                "Ixx": self.J[0, 0],
+                "Iyy": self.J[1, 1],
+                "Izz": self.J[2, 2],
+            }
             prop_values = self._randomize_values_by_info(prop_values, self.INERTIAL_PROP_RAND_INFO)
             if any(phy_quantity < 0 for phy_quantity in prop_values.values()):
                 raise ValueError(
                     "[ERROR] in Quadrotor.reset(), negative randomized inertial properties."
                 )
-        self.OVERRIDDEN_QUAD_MASS = prop_values["M"]
-        self.OVERRIDDEN_QUAD_INERTIA = [prop_values["Ixx"], prop_values["Iyy"], prop_values["Izz"]]
+            self.OVERRIDDEN_QUAD_MASS = prop_values["M"]
+            self.OVERRIDDEN_QUAD_INERTIA = [
+                prop_values["Ixx"],
+                prop_values["Iyy"],
+                prop_values["Izz"],
+            ]
+        else:
+            self.OVERRIDDEN_QUAD_MASS = self.MASS
+            self.OVERRIDDEN_QUAD_INERTIA = list(self._nominal_inertia)
 
         # Override inertial properties.
         p.changeDynamics(
@@ -531,33 +632,39 @@ class Quadrotor(BaseAviary):
             ref_gate_pose = self._gates_pose[init_gate_id - 1] # sample prev gate so that we can then fly through current
             INIT_XYZ = ref_gate_pose[[0, 1, 2]].tolist()
             INIT_VEL = [0, 0, 0]
-            INIT_RPY = ref_gate_pose[[3, 4, 5]].tolist()
+            INIT_QUAT = p.getQuaternionFromEuler(ref_gate_pose[[3, 4, 5]].tolist())
             INIT_ANG_VEL = [0, 0, 0]
         
+        elif not self.RANDOMIZED_INIT:
+            # Deterministic initial state, converted once in __init__.
+            INIT_XYZ, INIT_VEL, INIT_QUAT, INIT_ANG_VEL = self._nominal_init_kinematics
         else:
-            init_values = {
-                init_name: self.__dict__[init_name.upper()]
-                for init_name in self.INIT_STATE_LABELS[self.QUAD_TYPE]
-            }
-            if self.RANDOMIZED_INIT:
-                init_values = self._randomize_values_by_info(init_values, self.INIT_STATE_RAND_INFO)
-            INIT_XYZ = [init_values.get("init_" + k, 0.0) for k in ["x", "y", "z"]]
-            INIT_VEL = [init_values.get("init_" + k + "_dot", 0.0) for k in ["x", "y", "z"]]
-            INIT_RPY = [init_values.get("init_" + k, 0.0) for k in ["phi", "theta", "psi"]]
-            if self.QUAD_TYPE == QuadType.TWO_D:
-                INIT_ANG_VEL = [0, init_values.get("init_theta_dot", 0.0), 0]
+            init_values = self._init_nominal.copy()
+            if self._init_rand_low is not None:
+                init_values[self._init_rand_idx] += self.np_random.uniform(
+                    self._init_rand_low, self._init_rand_high
+                )
             else:
-                INIT_ANG_VEL = [init_values.get("init_" + k, 0.0) for k in ["p", "q", "r"]]
+                init_labels = self.INIT_STATE_LABELS[self.QUAD_TYPE]
+                init_values = self._randomize_values_by_info(
+                    dict(zip(init_labels, init_values)), self.INIT_STATE_RAND_INFO
+                )
+                init_values = np.array([init_values[name] for name in init_labels])
+            INIT_XYZ, INIT_VEL, INIT_QUAT, INIT_ANG_VEL = self._init_kinematics(init_values)
         p.resetBasePositionAndOrientation(
             self.DRONE_IDS[0],
             INIT_XYZ,
-            p.getQuaternionFromEuler(INIT_RPY),
+            INIT_QUAT,
             physicsClientId=self.PYB_CLIENT,
         )
         p.resetBaseVelocity(
             self.DRONE_IDS[0], INIT_VEL, INIT_ANG_VEL, physicsClientId=self.PYB_CLIENT
         )
 
+        if self.COST == Cost.QUADRATIC:
+            # Constant arguments of the per-step cost, converted once since Q and R are now fixed.
+            self._loss_consts = (cs.DM(self.U_GOAL), cs.DM(self.Q), cs.DM(self.R))
+
         # Update BaseAviary internal variables before calling self._get_observation().
         self._update_and_store_kinematic_information()
         obs, info = self._get_observation(), self._get_reset_info()
@@ -610,52 +717,100 @@ class Quadrotor(BaseAviary):
             self.adv_action = None
         # Construct full (3D) disturbance force.
         if disturb_force is not None:
-            if self.QUAD_TYPE == QuadType.ONE_D:
-                # Only disturb on z direction.
-                disturb_force = [0, 0, float(disturb_force)]
-            elif self.QUAD_TYPE == QuadType.TWO_D:
-                # Only disturb on x-z plane.
-                disturb_force = [float(disturb_force[0]), 0, float(disturb_force[1])]
-            elif self.QUAD_TYPE == QuadType.THREE_D:
-                disturb_force = np.asarray(disturb_force).flatten()
+            full_disturb_force = np.zeros(3)
+            full_disturb_force[self._disturb_force_idx] = np.ravel(disturb_force)
+            disturb_force = full_disturb_force
 
         # Advance the simulation.
         super()._advance_simulation(rpm, disturb_force)
         # Standard Gym return.
         obs = self._get_observation()
-        info = self._get_info()
+        # Error w.r.t. the current goal, shared by the info and the reward of this step.
+        state_error = self._get_state_error()
+        info = self._get_info(state_error)
         # IROS 2022 - After _get_info() to use this step's 'self' attributes.
         done = self._get_done()
-        rew = self._get_reward()
+        rew = self._get_reward(state_error)
         obs, rew, done, info = super().after_step(obs, rew, done, info)
         return obs, rew, done, info
 
-    def render(self, mode="human"):
+    def render(self, mode="human", with_depth=False, with_seg=False, shadow=True):
         """Retrieves a frame from PyBullet rendering.
 
         Args:
             mode (str): Unused.
+            with_depth (bool): if to also return the depth buffer.
+            with_seg (bool): if to also return the segmentation mask (extra rendering work).
+            shadow (bool): if to render shadows.
 
         Returns:
             ndarray: A multidimensional array with the RGB frame captured by PyBullet's camera.
+            ndarray (optional): The depth buffer of shape (h, w), if with_depth.
+            ndarray (optional): The segmentation mask of shape (h, w), if with_seg.
 
         """
-        [w, h, rgb, dep, seg] = p.getCameraImage(
+        if with_seg:
+            seg_flags = p.ER_SEGMENTATION_MASK_OBJECT_AND_LINKINDEX
+        else:
+            seg_flags = p.ER_NO_SEGMENTATION_MASK
+        w, h, rgb, dep, seg = p.getCameraImage(
             width=self.RENDER_WIDTH,
             height=self.RENDER_HEIGHT,
-            shadow=1,
+            shadow=int(shadow),
             viewMatrix=self.CAM_VIEW,
             projectionMatrix=self.CAM_PRO,
             renderer=p.ER_TINY_RENDERER,
-            flags=p.ER_SEGMENTATION_MASK_OBJECT_AND_LINKINDEX,
+            flags=seg_flags,
             physicsClientId=self.PYB_CLIENT,
         )
         # Image.fromarray(np.reshape(rgb, (h, w, 4)), 'RGBA').show()
-        return np.reshape(rgb, (h, w, 4))
+        rgb = np.reshape(rgb, (h, w, 4))
+        if not (with_depth or with_seg):
+            return rgb
+        frames = [rgb]
+        if with_depth:
+            frames.append(np.reshape(dep, (h, w)))
+        if with_seg:
+            frames.append(np.reshape(seg, (h, w)))
+        return tuple(frames)
 
     def _setup_symbolic(self):
+        """Sets the symbolic (CasADi) model for dynamics, observation, and cost.
+
+        The model only depends on the quadrotor type, control timestep, and nominal inertial
+        properties, so it is built once per parameter set and shared across instances.
+
+        """
+        key = (
+            self.QUAD_TYPE,
+            round(self.CTRL_TIMESTEP, 12),
+            round(self.MASS, 12),
+            round(self.GRAVITY_ACC, 12),
+            round(self.L, 12),
+            round(self.J[0, 0], 12),
+            round(self.J[1, 1], 12),
+            round(self.J[2, 2], 12),
+            round(self.KM / self.KF, 12),
+            self.SYMBOLIC_JIT,
+        )
+        with _SYM_CACHE_LOCK:
+            if key not in _SYM_CACHE:
+                func_opts = {"cse": True} if _CASADI_HAS_CSE else {}
+                cache_dir = None
+                if self.SYMBOLIC_JIT:
+                    func_opts.update(_SYM_JIT_OPTS)
+                    # Compiled functions are saved to disk, keyed by their graph and the host.
+                    cache_dir = _SYM_JIT_CACHE_DIR
+                _SYM_CACHE[key] = self._create_symbolic_model(func_opts, cache_dir)
+            self.symbolic = copy(_SYM_CACHE[key])
+
+    def _create_symbolic_model(self, func_opts=None, cache_dir=None):
         """Creates symbolic (CasADi) models for dynamics, observation, and cost.
 
+        Args:
+            func_opts (dict, optional): Options of the symbolic model's CasADi functions.
+            cache_dir (str, optional): Directory to save and reload jit compiled functions from.
+
         Returns:
             SymbolicModel: CasADi symbolic model of the environment.
 
@@ -663,15 +818,17 @@ class Quadrotor(BaseAviary):
         m, g, l = self.MASS, self.GRAVITY_ACC, self.L
         Iyy = self.J[1, 1]
         dt = self.CTRL_TIMESTEP
+        # The model only has scalar operations, so it is built from SX symbols that evaluate
+        # faster and have smaller derivatives than MX.
         # Define states.
-        z = cs.MX.sym("z")
-        z_dot = cs.MX.sym("z_dot")
+        z = cs.SX.sym("z")
+        z_dot = cs.SX.sym("z_dot")
         if self.QUAD_TYPE == QuadType.ONE_D:
             nx, nu = 2, 1
             # Define states.
             X = cs.vertcat(z, z_dot)
             # Define input thrust.
-            T = cs.MX.sym("T")
+            T = cs.SX.sym("T")
             U = cs.vertcat(T)
             # Define dynamics equations.
             X_dot = cs.vertcat(z_dot, T / m - g)
@@ -680,14 +837,14 @@ class Quadrotor(BaseAviary):
         elif self.QUAD_TYPE == QuadType.TWO_D:
             nx, nu = 6, 2
             # Define states.
-            x = cs.MX.sym("x")
-            x_dot = cs.MX.sym("x_dot")
-            theta = cs.MX.sym("theta")
-            theta_dot = cs.MX.sym("theta_dot")
+            x = cs.SX.sym("x")
+            x_dot = cs.SX.sym("x_dot")
+            theta = cs.SX.sym("theta")
+            theta_dot = cs.SX.sym("theta_dot")
             X = cs.vertcat(x, x_dot, z, z_dot, theta, theta_dot)
             # Define input thrusts.
-            T1 = cs.MX.sym("T1")
-            T2 = cs.MX.sym("T2")
+            T1 = cs.SX.sym("T1")
+            T2 = cs.SX.sym("T2")
             U = cs.vertcat(T1, T2)
             # Define dynamics equations.
             X_dot = cs.vertcat(
@@ -704,34 +861,39 @@ class Quadrotor(BaseAviary):
             nx, nu = 12, 4
             Ixx = self.J[0, 0]
             Izz = self.J[2, 2]
-            J = cs.blockcat([[Ixx, 0.0, 0.0], [0.0, Iyy, 0.0], [0.0, 0.0, Izz]])
-            Jinv = cs.blockcat(
-                [[1.0 / Ixx, 0.0, 0.0], [0.0, 1.0 / Iyy, 0.0], [0.0, 0.0, 1.0 / Izz]]
-            )
             gamma = self.KM / self.KF
-            x = cs.MX.sym("x")
-            y = cs.MX.sym("y")
-            phi = cs.MX.sym("phi")  # Roll
-            theta = cs.MX.sym("theta")  # Pitch
-            psi = cs.MX.sym("psi")  # Yaw
-            x_dot = cs.MX.sym("x_dot")
-            y_dot = cs.MX.sym("y_dot")
-            p = cs.MX.sym("p")  # Body frame roll rate
-            q = cs.MX.sym("q")  # body frame pith rate
-            r = cs.MX.sym("r")  # body frame yaw rate
-            # PyBullet Euler angles use the SDFormat for rotation matrices.
-            Rob = csRotXYZ(
-                phi, theta, psi
-            )  # rotation matrix transforming a vector in the body frame to the world frame.
+            x = cs.SX.sym("x")
+            y = cs.SX.sym("y")
+            phi = cs.SX.sym("phi")  # Roll
+            theta = cs.SX.sym("theta")  # Pitch
+            psi = cs.SX.sym("psi")  # Yaw
+            x_dot = cs.SX.sym("x_dot")
+            y_dot = cs.SX.sym("y_dot")
+            p = cs.SX.sym("p")  # Body frame roll rate
+            q = cs.SX.sym("q")  # body frame pith rate
+            r = cs.SX.sym("r")  # body frame yaw rate
+            # Trigonometric functions of the Euler angles, shared by all the expressions below.
+            sphi, cphi = cs.sin(phi), cs.cos(phi)
+            sth, cth, tth = cs.sin(theta), cs.cos(theta), cs.tan(theta)
+            spsi, cpsi = cs.sin(psi), cs.cos(psi)
+            # PyBullet Euler angles use the SDFormat for rotation matrices, i.e. csRotXYZ().
+            # Rotation matrix transforming a vector in the body frame to the world frame.
+            Rob = cs.blockcat(
+                [
+                    [cpsi * cth, cpsi * sth * sphi - spsi * cphi, cpsi * sth * cphi + spsi * sphi],
+                    [spsi * cth, spsi * sth * sphi + cpsi * cphi, spsi * sth * cphi - cpsi * sphi],
+                    [-sth, cth * sphi, cth * cphi],
+                ]
+            )
 
             # Define state variables.
             X = cs.vertcat(x, x_dot, y, y_dot, z, z_dot, phi, theta, psi, p, q, r)
 
             # Define inputs.
-            f1 = cs.MX.sym("f1")
-            f2 = cs.MX.sym("f2")
-            f3 = cs.MX.sym("f3")
-            f4 = cs.MX.sym("f4")
+            f1 = cs.SX.sym("f1")
+            f2 = cs.SX.sym("f2")
+            f3 = cs.SX.sym("f3")
+            f4 = cs.SX.sym("f4")
             U = cs.vertcat(f1, f2, f3, f4)
 
             # From Ch. 2 of Luis, Carlos, and Jérôme Le Ny. "Design of a trajectory tracking
@@ -740,22 +902,28 @@ class Quadrotor(BaseAviary):
             # Defining the dynamics function.
             # We are using the velocity of the base wrt to the world frame expressed in the world
             # frame. Note that the reference expresses this in the body frame.
-            oVdot_cg_o = Rob @ cs.vertcat(0, 0, f1 + f2 + f3 + f4) / m - cs.vertcat(0, 0, g)
-            pos_ddot = oVdot_cg_o
+            # The collective thrust acts along the body z axis, i.e. the last column of Rob.
+            F = f1 + f2 + f3 + f4
+            pos_ddot = cs.vertcat(Rob[0, 2] * F / m, Rob[1, 2] * F / m, Rob[2, 2] * F / m - g)
             pos_dot = cs.vertcat(x_dot, y_dot, z_dot)
             Mb = cs.vertcat(
                 l / cs.sqrt(2.0) * (f1 + f2 - f3 - f4),
                 l / cs.sqrt(2.0) * (-f1 + f2 + f3 - f4),
                 gamma * (f1 - f2 + f3 - f4),
             )
-            rate_dot = Jinv @ (Mb - (cs.skew(cs.vertcat(p, q, r)) @ J @ cs.vertcat(p, q, r)))
-            ang_dot = cs.blockcat(
-                [
-                    [1, cs.sin(phi) * cs.tan(theta), cs.cos(phi) * cs.tan(theta)],
-                    [0, cs.cos(phi), -cs.sin(phi)],
-                    [0, cs.sin(phi) / cs.cos(theta), cs.cos(phi) / cs.cos(theta)],
-                ]
-            ) @ cs.vertcat(p, q, r)
+            # Euler's equations for the diagonal inertia, with the gyroscopic term w x (J w).
+            rate_dot = cs.vertcat(
+                (1.0 / Ixx) * (Mb[0] - (Izz - Iyy) * q * r),
+                (1.0 / Iyy) * (Mb[1] - (Ixx - Izz) * r * p),
+                (1.0 / Izz) * (Mb[2] - (Iyy - Ixx) * p * q),
+            )
+            # Euler angle rates from the body rates, written per component instead of as a
+            # product with the (partly constant) transformation matrix.
+            ang_dot = cs.vertcat(
+                p + sphi * tth * q + cphi * tth * r,
+                cphi * q - sphi * r,
+                sphi / cth * q + cphi / cth * r,
+            )
             X_dot = cs.vertcat(
                 pos_dot[0],
                 pos_ddot[0],
@@ -767,13 +935,19 @@ class Quadrotor(BaseAviary):
                 rate_dot,
             )
 
+            if _CASADI_HAS_CSE:
+                # Merge repeated subexpressions, so they are shared by the derivatives as well.
+                X_dot = cs.cse(X_dot)
+
             Y = cs.vertcat(x, x_dot, y, y_dot, z, z_dot, phi, theta, psi, p, q, r)
         # Define cost (quadratic form).
-        Q = cs.MX.sym("Q", nx, nx)
-        R = cs.MX.sym("R", nu, nu)
-        Xr = cs.MX.sym("Xr", nx, 1)
-        Ur = cs.MX.sym("Ur", nu, 1)
-        cost_func = 0.5 * (X - Xr).T @ Q @ (X - Xr) + 0.5 * (U - Ur).T @ R @ (U - Ur)
+        Q = cs.SX.sym("Q", nx, nx)
+        R = cs.SX.sym("R", nu, nu)
+        Xr = cs.SX.sym("Xr", nx, 1)
+        Ur = cs.SX.sym("Ur", nu, 1)
+        X_err = X - Xr
+        U_err = U - Ur
+        cost_func = 0.5 * X_err.T @ Q @ X_err + 0.5 * U_err.T @ R @ U_err
         # Define dynamics and cost dictionaries.
         dynamics = {"dyn_eqn": X_dot, "obs_eqn": Y, "vars": {"X": X, "U": U}}
         cost = {
@@ -781,7 +955,9 @@ class Quadrotor(BaseAviary):
             "vars": {"X": X, "U": U, "Xr": Xr, "Ur": Ur, "Q": Q, "R": R},
         }
         # Setup symbolic model.
-        self.symbolic = SymbolicModel(dynamics=dynamics, cost=cost, dt=dt)
+        return SymbolicModel(
+            dynamics=dynamics, cost=cost, dt=dt, func_opts=func_opts, cache_dir=cache_dir
+        )
 
     def _set_action_space(self):
         """Returns the action space of the environment.
@@ -829,6 +1005,14 @@ class Quadrotor(BaseAviary):
                 high=np.full(action_dim, a_high, np.float32),
                 dtype=np.float32,
             )
+        # Action bounds as plain arrays, used to clip every action in _preprocess_control().
+        self._action_low = self.action_space.low
+        self._action_high = self.action_space.high
+        # Motors driven by each thrust input (2D: motors 1 & 4, then 2 & 3), see cmd2pwm().
+        self._motors_per_thrust = 4 // action_dim
+        self._thrust_motor_idx = np.array(
+            {1: [0, 0, 0, 0], 2: [0, 1, 1, 0], 4: [0, 1, 2, 3]}[action_dim]
+        )
 
     def _set_observation_space(self):
         """Returns the observation space of the environment.
@@ -848,8 +1032,8 @@ class Quadrotor(BaseAviary):
         # Define obs/state bounds, labels and units.
         if self.QUAD_TYPE == QuadType.ONE_D:
             # obs/state = {z, z_dot}.
-            low = np.array([self.GROUND_PLANE_Z, -np.finfo(np.float32).max])
-            high = np.array([self.z_threshold, np.finfo(np.float32).max])
+            low = np.array([self.GROUND_PLANE_Z, -_F32_MAX])
+            high = np.array([self.z_threshold, _F32_MAX])
             self.STATE_LABELS = ["z", "z_dot"]
             self.STATE_UNITS = ["m", "m/s"]
         elif self.QUAD_TYPE == QuadType.TWO_D:
@@ -857,21 +1041,21 @@ class Quadrotor(BaseAviary):
             low = np.array(
                 [
                     -self.x_threshold,
-                    -np.finfo(np.float32).max,
+                    -_F32_MAX,
                     self.GROUND_PLANE_Z,
-                    -np.finfo(np.float32).max,
+                    -_F32_MAX,
                     -self.theta_threshold_radians,
-                    -np.finfo(np.float32).max,
+                    -_F32_MAX,
                 ]
             )
             high = np.array(
                 [
                     self.x_threshold,
-                    np.finfo(np.float32).max,
+                    _F32_MAX,
                     self.z_threshold,
-                    np.finfo(np.float32).max,
+                    _F32_MAX,
                     self.theta_threshold_radians,
-                    np.finfo(np.float32).max,
+                    _F32_MAX,
                 ]
             )
             self.STATE_LABELS = ["x", "x_dot", "z", "z_dot", "theta", "theta_dot"]
@@ -881,33 +1065,33 @@ class Quadrotor(BaseAviary):
             low = np.array(
                 [
                     -self.x_threshold,
-                    -np.finfo(np.float32).max,
+                    -_F32_MAX,
                     -self.y_threshold,
-                    -np.finfo(np.float32).max,
+                    -_F32_MAX,
                     self.GROUND_PLANE_Z,
-                    -np.finfo(np.float32).max,
+                    -_F32_MAX,
                     -self.phi_threshold_radians,
                     -self.theta_threshold_radians,
                     -self.psi_threshold_radians,
-                    -np.finfo(np.float32).max,
-                    -np.finfo(np.float32).max,
-                    -np.finfo(np.float32).max,
+                    -_F32_MAX,
+                    -_F32_MAX,
+                    -_F32_MAX,
                 ]
             )
             high = np.array(
                 [
                     self.x_threshold,
-                    np.finfo(np.float32).max,
+                    _F32_MAX,
                     self.y_threshold,
-                    np.finfo(np.float32).max,
+                    _F32_MAX,
                     self.z_threshold,
-                    np.finfo(np.float32).max,
+                    _F32_MAX,
                     self.phi_threshold_radians,
                     self.theta_threshold_radians,
                     self.psi_threshold_radians,
-                    np.finfo(np.float32).max,
-                    np.finfo(np.float32).max,
-                    np.finfo(np.float32).max,
+                    _F32_MAX,
+                    _F32_MAX,
+                    _F32_MAX,
                 ]
             )
             self.STATE_LABELS = [
@@ -940,6 +1124,15 @@ class Quadrotor(BaseAviary):
             ]
         # Define the state space for the dynamics.
         self.state_space = spaces.Box(low=low, high=high, dtype=np.float32)
+        # State components checked for out-of-bound termination in _get_done(), i.e. not the
+        # velocities.
+        self._bounded_state_idx = {
+            QuadType.ONE_D: [0],
+            QuadType.TWO_D: [0, 2, 4],
+            QuadType.THREE_D: [0, 2, 4, 6, 7, 8],
+        }[self.QUAD_TYPE]
+        self._bounded_state_low = self.state_space.low[self._bounded_state_idx]
+        self._bounded_state_high = self.state_space.high[self._bounded_state_idx]
 
         # Concatenate reference for RL.
         if (
@@ -969,6 +1162,13 @@ class Quadrotor(BaseAviary):
         self.DISTURBANCE_MODES["observation"]["dim"] = self.obs_dim
         self.DISTURBANCE_MODES["action"]["dim"] = self.action_dim
         self.DISTURBANCE_MODES["dynamics"]["dim"] = int(self.QUAD_TYPE)
+        # Axes of the full (3D) force disturbed by the dynamics disturbance: z only for the 1D
+        # quadrotor, the x-z plane for the 2D quadrotor.
+        self._disturb_force_idx = {
+            QuadType.ONE_D: [2],
+            QuadType.TWO_D: [0, 2],
+            QuadType.THREE_D: [0, 1, 2],
+        }[self.QUAD_TYPE]
         super()._setup_disturbances()
 
     def _preprocess_control(self, action):
@@ -983,11 +1183,11 @@ class Quadrotor(BaseAviary):
         """
         if self.NORMALIZED_RL_ACTION_SPACE:
             # rescale action to around hover thrust
-            action = np.clip(action, self.action_space.low, self.action_space.high)
+            action = np.clip(action, self._action_low, self._action_high)
             thrust = (1 + self.norm_act_scale * action) * self.hover_thrust
         else:
-            thrust = np.clip(action, self.action_space.low, self.action_space.high)
-        if not np.array_equal(thrust, np.array(action)) and self.VERBOSE:
+            thrust = np.clip(action, self._action_low, self._action_high)
+        if self.VERBOSE and not np.array_equal(thrust, action):
             logger.warning("Action was clipped in Quadrotor._preprocess_control().")
         self.current_preprocessed_action = thrust
         # Apply disturbances.
@@ -995,11 +1195,17 @@ class Quadrotor(BaseAviary):
             thrust = self.disturbances["action"].apply(thrust, self)
         if self.adversary_disturbance == "action":
             thrust = thrust + self.adv_action
-        # convert to quad motor rpm commands
-        pwm = cmd2pwm(
-            thrust, self.PWM2RPM_SCALE, self.PWM2RPM_CONST, self.KF, self.MIN_PWM, self.MAX_PWM
-        )
-        rpm = pwm2rpm(pwm, self.PWM2RPM_SCALE, self.PWM2RPM_CONST)
+        # Convert to quad motor rpm commands, i.e. cmd2pwm() and pwm2rpm() computed in place.
+        pwm = np.maximum(thrust, 0.0)  # Make sure thrust is not negative.
+        pwm /= self._motors_per_thrust
+        pwm /= self.KF
+        np.sqrt(pwm, out=pwm)
+        pwm -= self.PWM2RPM_CONST
+        pwm /= self.PWM2RPM_SCALE
+        np.clip(pwm, self.MIN_PWM, self.MAX_PWM, out=pwm)
+        rpm = pwm[self._thrust_motor_idx]
+        rpm *= self.PWM2RPM_SCALE
+        rpm += self.PWM2RPM_CONST
         return rpm
 
     def _get_observation(self):
@@ -1009,24 +1215,12 @@ class Quadrotor(BaseAviary):
             ndarray: The state of the quadrotor, of size 2 or 6 depending on QUAD_TYPE.
 
         """
-        full_state = self._get_drone_state_vector(0)
-        pos, _, rpy, vel, ang_v, _ = np.split(full_state, [3, 7, 10, 13, 16])
-        if self.QUAD_TYPE == QuadType.ONE_D:
-            # {z, z_dot}.
-            self.state = np.hstack([pos[2], vel[2]]).reshape((2,))
-        elif self.QUAD_TYPE == QuadType.TWO_D:
-            # {x, x_dot, z, z_dot, theta, theta_dot}.
-            self.state = np.hstack([pos[0], vel[0], pos[2], vel[2], rpy[1], ang_v[1]]).reshape((6,))
-        elif self.QUAD_TYPE == QuadType.THREE_D:
-            Rob = np.array(p.getMatrixFromQuaternion(self.quat[0])).reshape((3, 3))
-            Rbo = Rob.T
-            ang_v_body_frame = Rbo @ ang_v
-            # {x, x_dot, y, y_dot, z, z_dot, phi, theta, psi, p, q, r}.
-            self.state = np.hstack(
-                [pos[0], vel[0], pos[1], vel[1], pos[2], vel[2], rpy, ang_v_body_frame]
-            ).reshape((12,))
+        # Read the kinematics stored by BaseAviary directly, without stacking the full state vector.
+        self.state = self._pack_state(
+            self.pos[0], self.quat[0], self.rpy[0], self.vel[0], self.ang_v[0]
+        )
         # Apply observation disturbance.
-        obs = deepcopy(self.state)
+        obs = self.state.copy()
         if "observation" in self.disturbances:
             obs = self.disturbances["observation"].apply(obs, self)
 
@@ -1034,85 +1228,90 @@ class Quadrotor(BaseAviary):
         obs = self.extend_obs(obs, self.ctrl_step_counter + 1)
         return obs
 
-    def _get_reward(self):
-        """Computes the current step's reward value.
+    def _get_state_error(self):
+        """Computes the error of the current state w.r.t. the current goal.
 
         Returns:
-            float: The evaluated reward/cost.
+            ndarray: The state minus the goal state (or the current waypoint when tracking).
 
         """
-        # RL cost.
-        if self.COST == Cost.RL_REWARD:
-            state = self.state
-            act = np.asarray(self.current_preprocessed_action)
-            act_error = act - self.U_GOAL
-            # Quadratic costs w.r.t state and action
-            # TODO: consider using multiple future goal states for cost in tracking
-            if self.TASK == Task.STABILIZATION:
-                state_error = state - self.X_GOAL
-                dist = np.sum(self.rew_state_weight * state_error * state_error)
-                dist += np.sum(self.rew_act_weight * act_error * act_error)
-            if self.TASK == Task.TRAJ_TRACKING:
-                wp_idx = min(self.ctrl_step_counter, self.X_GOAL.shape[0] - 1)
-                state_error = state - self.X_GOAL[wp_idx]
-                dist = np.sum(self.rew_state_weight * state_error * state_error)
-                dist += np.sum(self.rew_act_weight * act_error * act_error)
-            rew = -dist
-            # Convert rew to be positive and bounded [0,1].
-            if self.rew_exponential:
-                rew = np.exp(rew)
-            return rew
-
-        # Control cost.
-        if self.COST == Cost.QUADRATIC:
-            if self.TASK == Task.STABILIZATION:
-                return float(
-                    -1
-                    * self.symbolic.loss(
-                        x=self.state,
-                        Xr=self.X_GOAL,
-                        u=self.current_preprocessed_action,
-                        Ur=self.U_GOAL,
-                        Q=self.Q,
-                        R=self.R,
-                    )["l"]
-                )
-            if self.TASK == Task.TRAJ_TRACKING:
-                return float(
-                    -1
-                    * self.symbolic.loss(
-                        x=self.state,
-                        Xr=self.X_GOAL[self.ctrl_step_counter, :],
-                        u=self.current_preprocessed_action,
-                        Ur=self.U_GOAL,
-                        Q=self.Q,
-                        R=self.R,
-                    )["l"]
-                )
+        if self.TASK == Task.STABILIZATION:
+            return self.state - self.X_GOAL
+        wp_idx = min(self.ctrl_step_counter, self.X_GOAL.shape[0] - 1)
+        return self.state - self.X_GOAL[wp_idx]
 
-        # IROS 2022 - Competition sparse reward signal.
-        if self.COST == Cost.COMPETITION:
-            reward = 0
-            # Reward for stepping through the (correct) next gate.
-            if self.stepped_through_gate:
-                reward += 100
-            # Reward for reaching goal position (after navigating the gates in the correct order).
-            if self.at_goal_pos:
-                reward += 100
-            # Penalize by collision.
-            if self.currently_collided:
-                reward -= 1000
-            # Penalize by constraint violation.
-            if self.cnstr_violation:
-                reward -= 100
-            # Penalize by loss from X_GOAL, U_GOAL state.
-            # reward += float(-1 * self.symbolic.loss(x=self.state,
-            #                                         Xr=self.X_GOAL,
-            #                                         u=self.current_preprocessed_action,
-            #                                         Ur=self.U_GOAL,
-            #                                         Q=self.Q,
-            #                                         R=self.R)["l"])
-            return reward
+    def _get_rl_reward(self, state_error):
+        """Computes the current step's reward value for the RL cost.
+
+        Args:
+            state_error (ndarray): The error of the current state, see _get_state_error().
+
+        Returns:
+            float: The evaluated reward.
+
+        """
+        # The preprocessed action is always an ndarray, see _preprocess_control().
+        act_error = self.current_preprocessed_action - self.U_GOAL
+        # Quadratic costs w.r.t state and action
+        # TODO: consider using multiple future goal states for cost in tracking
+        dist = np.dot(self.rew_state_weight * state_error, state_error)
+        dist += np.dot(self.rew_act_weight * act_error, act_error)
+        rew = -dist
+        # Convert rew to be positive and bounded [0,1].
+        if self.rew_exponential:
+            rew = math.exp(rew)
+        return rew
+
+    def _get_quadratic_reward(self, state_error):
+        """Computes the current step's reward value for the quadratic cost.
+
+        Args:
+            state_error (ndarray): Unused, the cost is evaluated on the state itself.
+
+        Returns:
+            float: The negative control cost.
+
+        """
+        if self.TASK == Task.STABILIZATION:
+            x_goal = self.X_GOAL
+        else:
+            x_goal = self.X_GOAL[self.ctrl_step_counter, :]
+        loss = self._loss_func(
+            self.state, self.current_preprocessed_action, x_goal, *self._loss_consts
+        )
+        return -float(loss)
+
+    def _get_competition_reward(self, state_error):
+        """Computes the current step's IROS 2022 competition sparse reward.
+
+        Args:
+            state_error (ndarray): Unused.
+
+        Returns:
+            float: The evaluated reward.
+
+        """
+        reward = 0
+        # Reward for stepping through the (correct) next gate.
+        if self.stepped_through_gate:
+            reward += 100
+        # Reward for reaching goal position (after navigating the gates in the correct order).
+        if self.at_goal_pos:
+            reward += 100
+        # Penalize by collision.
+        if self.currently_collided:
+            reward -= 1000
+        # Penalize by constraint violation.
+        if self.cnstr_violation:
+            reward -= 100
+        # Penalize by loss from X_GOAL, U_GOAL state.
+        # reward += float(-1 * self.symbolic.loss(x=self.state,
+        #                                         Xr=self.X_GOAL,
+        #                                         u=self.current_preprocessed_action,
+        #                                         Ur=self.U_GOAL,
+        #                                         Q=self.Q,
+        #                                         R=self.R)["l"])
+        return reward
 
     def _get_done(self):
         """Computes the conditions for termination of an episode.
@@ -1136,18 +1335,12 @@ class Quadrotor(BaseAviary):
 
         # Done if state is out-of-bounds.
         if self.done_on_out_of_bound:
-            if self.QUAD_TYPE == QuadType.ONE_D:
-                mask = np.array([1, 0])
-            if self.QUAD_TYPE == QuadType.TWO_D:
-                mask = np.array([1, 0, 1, 0, 1, 0])
-            if self.QUAD_TYPE == QuadType.THREE_D:
-                mask = np.array([1, 0, 1, 0, 1, 0, 1, 1, 1, 0, 0, 0])
-            # Element-wise or to check out-of-bound conditions.
-            out_of_bound = np.logical_or(
-                self.state < self.state_space.low, self.state > self.state_space.high
+            # Only check the bounded dimensions (i.e. not velocities).
+            bounded_state = self.state[self._bounded_state_idx]
+            out_of_bound = np.any(
+                (bounded_state < self._bounded_state_low)
+                | (bounded_state > self._bounded_state_high)
             )
-            # Mask out un-included dimensions (i.e. velocities)
-            out_of_bound = np.any(out_of_bound * mask)
             # Early terminate if needed.
             if out_of_bound:
                 return True
@@ -1161,9 +1354,12 @@ class Quadrotor(BaseAviary):
 
         return False
 
-    def _get_info(self):
+    def _get_info(self, state_error):
         """Generates the info dictionary returned by every call to .step().
 
+        Args:
+            state_error (ndarray): The error of the current state, see _get_state_error().
+
         Returns:
             dict: A dictionary with information about the constraints evaluations and violations.
 
@@ -1172,30 +1368,18 @@ class Quadrotor(BaseAviary):
         if self.TASK == Task.STABILIZATION and self.COST == Cost.QUADRATIC:
             info["goal_reached"] = self.goal_reached  # Add boolean flag for the goal being reached.
         # Add MSE.
-        state = deepcopy(self.state)
-        if self.TASK == Task.STABILIZATION:
-            state_error = state - self.X_GOAL
-        elif self.TASK == Task.TRAJ_TRACKING:
-            # TODO: should use angle wrapping
-            # state[4] = normalize_angle(state[4])
-            wp_idx = min(self.ctrl_step_counter, self.X_GOAL.shape[0] - 1)
-            state_error = state - self.X_GOAL[wp_idx]
+        # TODO: should use angle wrapping for trajectory tracking
         # Filter only relevant dimensions.
-        state_error = state_error * self.info_mse_metric_state_weight
-        info["mse"] = np.sum(state_error**2)
+        info["mse"] = np.dot(self._info_mse_weight_sq * state_error, state_error)
 
         # Note: constraint_values and constraint_violations populated in benchmark_env.
 
         # IROS 2022 - Per-step info.
-        # Collisions
-        for GATE_OBS_ID in self.GATES_IDS + self.OBSTACLES_IDS + [self.PLANE_ID]:
-            ret = p.getContactPoints(
-                bodyA=GATE_OBS_ID,
-                bodyB=self.DRONE_IDS[0],
-                # linkIndexA=-1, linkIndexB=-1,
-                physicsClientId=self.PYB_CLIENT,
-            )
-            if ret:
+        # Collisions, from all of the drone's contact points queried at once.
+        contacts = p.getContactPoints(bodyA=self.DRONE_IDS[0], physicsClientId=self.PYB_CLIENT)
+        contact_ids = {contact[2] for contact in contacts}
+        for GATE_OBS_ID in self._collision_ids:
+            if GATE_OBS_ID in contact_ids:
                 info["collision"] = (GATE_OBS_ID, True)
                 self.currently_collided = True
                 break  # Note: only returning the first collision per step.
@@ -1210,42 +1394,45 @@ class Quadrotor(BaseAviary):
             and self.current_gate < self.NUM_GATES
         ):
             x, y, _, _, _, rot = self._gates_pose[self.current_gate]
-            if self.GATES[self.current_gate][6] == 0:
-                height = self.GATE_Z_HIGH  # URDF dependent.
-            elif self.GATES[self.current_gate][6] == 1:
-                height = self.GATE_Z_LOW  # URDF dependent.
-            else:
-                raise ValueError("Unknown gate type.")
+            height = self._gate_z[self.current_gate]
             half_length = 0.1875  # Obstacle URDF dependent.
             delta_x = 0.05 * np.cos(rot)
             delta_y = 0.05 * np.sin(rot)
-            fr = [[x, y, height - half_length]]
-            to = [[x, y, height + half_length]]
-            for i in [1, 2, 3]:
-                fr.append([x + i * delta_x, y + i * delta_y, height - half_length])
-                fr.append([x - i * delta_x, y - i * delta_y, height - half_length])
-                to.append([x + i * delta_x, y + i * delta_y, height + half_length])
-                to.append([x - i * delta_x, y - i * delta_y, height + half_length])
+            fr, to = self._gate_ray_from, self._gate_ray_to
+            np.multiply(self._gate_ray_steps, delta_x, out=fr[:, 0])
+            fr[:, 0] += x
+            np.multiply(self._gate_ray_steps, delta_y, out=fr[:, 1])
+            fr[:, 1] += y
+            fr[:, 2] = height - half_length
+            to[:, :2] = fr[:, :2]
+            to[:, 2] = height + half_length
             rays = p.rayTestBatch(
                 rayFromPositions=fr, rayToPositions=to, physicsClientId=self.PYB_CLIENT
             )
-            self.stepped_through_gate = False
-            for r in rays:
-                if r[2] < 0.9999:
-                    self.current_gate += 1
-                    self.stepped_through_gate = True
-                    break
+            self.stepped_through_gate = any(r[2] < 0.9999 for r in rays)
+            if self.stepped_through_gate:
+                self.current_gate += 1
         # LSY Drone Racing
         # Always add the nominal gate positions. If any gates are in range, update the position. If
         # any obstacles are in range, also update the obstacle positions.
         VISIBILITY_RANGE = 0.45
-        info["gates_pose"] = self.GATES[:, :6].copy()
-        info["gates_pose"][:, 2] = np.where(self.GATES[:, 6], self.GATE_Z_LOW, self.GATE_Z_HIGH)
-        info["obstacles_pose"] = self.OBSTACLES.copy()
-        info["obstacles_pose"][:, 2] = self.OBSTACLE_Z
+        info["gates_pose"] = self._gates_pose_nominal.copy()
+        info["obstacles_pose"] = self._obstacles_pose_nominal.copy()
         info["gates_in_range"] = np.zeros(self.NUM_GATES, dtype=bool)
         info["obstacles_in_range"] = np.zeros(self.n_obstacles, dtype=bool)
+        # Only bodies whose bounding boxes overlap the drone's, grown by the visibility range, can
+        # be in range. The extra margin covers the broadphase boxes lagging the last integration.
+        aabb_min, aabb_max = p.getAABB(self.DRONE_IDS[0], physicsClientId=self.PYB_CLIENT)
+        margin = VISIBILITY_RANGE + 0.1
+        nearby = p.getOverlappingObjects(
+            [v - margin for v in aabb_min],
+            [v + margin for v in aabb_max],
+            physicsClientId=self.PYB_CLIENT,
+        )
+        nearby_ids = set() if nearby is None else {body_id for body_id, _ in nearby}
         for i in range(self.NUM_GATES):
+            if self.GATES_IDS[i] not in nearby_ids:
+                continue
             closest_points = p.getClosestPoints(
                 bodyA=self.GATES_IDS[i],
                 bodyB=self.DRONE_IDS[0],
@@ -1256,6 +1443,8 @@ class Quadrotor(BaseAviary):
                 info["gates_pose"][i] = self._gates_pose[i]
                 info["gates_in_range"][i] = True
         for i in range(self.n_obstacles):
+            if self.OBSTACLES_IDS[i] not in nearby_ids:
+                continue
             closest_points = p.getClosestPoints(
                 bodyA=self.OBSTACLES_IDS[i],
                 bodyB=self.DRONE_IDS[0],
@@ -1273,13 +1462,12 @@ class Quadrotor(BaseAviary):
         info["at_goal_position"] = False
         info["task_completed"] = False
         if self.current_gate == self.NUM_GATES:
-            if self.QUAD_TYPE == QuadType.THREE_D:
-                quad_xyz = np.array([self.state[0], self.state[2], self.state[4]])
-                goal_xyz = np.array([self.X_GOAL[0], self.X_GOAL[2], self.X_GOAL[4]])
-                if (
-                    np.linalg.norm(quad_xyz - goal_xyz)
-                    < self.TASK_INFO["stabilization_goal_tolerance"]
-                ):
+            if self._is_3d:
+                # Position error, i.e. {x, y, z} - goal.
+                ex, ey, ez = state_error[0:5:2].tolist()
+                # Only read here, configs without a 3D goal may leave the tolerance out.
+                tol = self.TASK_INFO["stabilization_goal_tolerance"]
+                if ex * ex + ey * ey + ez * ez < tol * tol:
                     self.at_goal_pos = True
                     self.steps_at_goal_pos += 1
                 else:
@@ -1298,9 +1486,75 @@ class Quadrotor(BaseAviary):
 
         return info
 
+    def _init_kinematics(self, init_values):
+        """Converts initial state values to the drone kinematics set in reset().
+
+        Args:
+            init_values (ndarray): The initial state values, ordered as INIT_STATE_LABELS.
+
+        Returns:
+            ndarray: The position.
+            ndarray: The linear velocity.
+            ndarray: The orientation quaternion.
+            ndarray: The angular velocity.
+
+        """
+        full_init_values = np.zeros(12)
+        full_init_values[self._init_full_idx] = init_values
+        return (
+            full_init_values[0:3],
+            full_init_values[3:6],
+            quaternion_from_euler(full_init_values[6:9]),
+            full_init_values[9:12],
+        )
+
+    def _setup_init_state_randomization(self):
+        """Precomputes the randomization of the initial state used in reset().
+
+        Uniform distributions given by keyword arguments are stored as arrays of bounds, so that
+        all components are drawn with a single call. Other distributions are left to
+        _randomize_values_by_info().
+
+        """
+        init_labels = self.INIT_STATE_LABELS[self.QUAD_TYPE]
+        rand_idx = [i for i, name in enumerate(init_labels) if name in self.INIT_STATE_RAND_INFO]
+        rand_info = [self.INIT_STATE_RAND_INFO[init_labels[i]] for i in rand_idx]
+        self._init_rand_idx = np.array(rand_idx, dtype=int)
+        if all(
+            info["distrib"] == "uniform" and set(info) <= {"distrib", "low", "high"}
+            for info in rand_info
+        ):
+            self._init_rand_low = np.array([info.get("low", 0.0) for info in rand_info])
+            self._init_rand_high = np.array([info.get("high", 1.0) for info in rand_info])
+        else:
+            self._init_rand_low = self._init_rand_high = None
+
+    def _setup_gates_and_obstacles_randomization(self):
+        """Parses GATES_AND_OBS_RAND_INFO into (distrib, args, kwargs) tuples used by reset()."""
+        self._gates_and_obs_rand = {}
+        for key in ["obstacles", "gates"]:
+            info = self.GATES_AND_OBS_RAND_INFO[key]
+            d_kwargs = {k: v for k, v in info.items() if k not in ("distrib", "args")}
+            self._gates_and_obs_rand[key] = (info["distrib"], info.get("args", []), d_kwargs)
+
     def _get_reset_info(self):
         """Generates the info dictionary returned by every call to .reset().
 
+        Returns:
+            dict: A dictionary with information about the dynamics and constraints symbolic models.
+
+        """
+        # The models, parameters and maze description are the same for every reset, only the
+        # per-step info has to be generated.
+        if self._reset_info_constants is None:
+            self._reset_info_constants = self._get_reset_info_constants()
+        info = dict(self._reset_info_constants)
+        info.update(self._get_info(self._get_state_error()))
+        return info
+
+    def _get_reset_info_constants(self):
+        """Generates the part of the reset info dictionary that is fixed for the environment.
+
         Returns:
             dict: A dictionary with information about the dynamics and constraints symbolic models.
 
@@ -1353,8 +1607,6 @@ class Quadrotor(BaseAviary):
         info["disturbances"] = self.DISTURBANCES
         info["pyb_client"] = self.PYB_CLIENT
         info["urdf_dir"] = self.URDF_DIR
-
-        info.update(self._get_info())
         return info
 
     def set_gate_obstacle_randomization(self, gate_random_dist, obstace_random_dist):
@@ -1364,6 +1616,8 @@ class Quadrotor(BaseAviary):
             "obstacles": {"distrib": "uniform", "low": -obstace_random_dist, "high": obstace_random_dist},
         }
         self.GATES_AND_OBS_RAND_INFO = munchify(update_dict)
+        self._setup_gates_and_obstacles_randomization()
+        self._reset_info_constants = None
     
     def set_init_state_randomization(self, pos_random_dist_x, pos_random_dist_y, pos_random_dist_z):
         self.RANDOMIZED_INIT = True
@@ -1373,3 +1627,5 @@ class Quadrotor(BaseAviary):
             "init_z": {"distrib": "uniform", "low": -pos_random_dist_z, "high": pos_random_dist_z},
         }
         self.INIT_STATE_RAND_INFO = munchify(update_dict)
+        self._setup_init_state_randomization()
+        self._reset_info_constants = None
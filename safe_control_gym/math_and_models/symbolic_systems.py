@@ -1,10 +1,27 @@
 """Symbolic Models.
 
 """
+import hashlib
+import os
+import platform
+import tempfile
 import numpy as np
 import casadi as cs
 
 
+def _host_id():
+    """Identifies the host CPU that jit compiled binaries are built for."""
+    cpu_keys = ("model name", "flags", "Features", "CPU part")
+    try:
+        with open("/proc/cpuinfo") as f:
+            # The model and instruction set of the first core.
+            first_core = f.read().split("\n\n")[0].splitlines()
+        cpu = tuple(line for line in first_core if line.startswith(cpu_keys))
+    except OSError:
+        cpu = platform.processor()
+    return platform.system(), platform.machine(), cpu
+
+
 class SymbolicModel:
     """Implements the dynamics model with symbolic variables.
 
@@ -18,7 +35,16 @@ class SymbolicModel:
 
     """
 
-    def __init__(self, dynamics, cost, dt=1e-3, integration_algo="cvodes", funcs=None):
+    def __init__(
+        self,
+        dynamics,
+        cost,
+        dt=1e-3,
+        integration_algo="cvodes",
+        funcs=None,
+        func_opts=None,
+        cache_dir=None,
+    ):
         """ """
         # Setup for dynamics.
         self.x_sym = dynamics["vars"]["X"]
@@ -32,6 +58,10 @@ class SymbolicModel:
         self.dt = dt
         # Integration algorithm.
         self.integration_algo = integration_algo
+        # Options of the exposed CasADi functions (e.g. cse, jit).
+        self.func_opts = {} if func_opts is None else func_opts
+        # Directory to save and reload jit compiled functions from.
+        self.cache_dir = cache_dir
         # Other symbolic functions.
         if funcs is not None:
             for name, func in funcs.items():
@@ -55,7 +85,9 @@ class SymbolicModel:
     def setup_model(self):
         """Exposes functions to evaluate the model."""
         # Continuous time dynamics.
-        self.fc_func = cs.Function("fc", [self.x_sym, self.u_sym], [self.x_dot], ["x", "u"], ["f"])
+        self.fc_func = self._function(
+            "fc", [self.x_sym, self.u_sym], [self.x_dot], ["x", "u"], ["f"]
+        )
         # Discrete time dynamics.
         self.fd_func = cs.integrator(
             "fd",
@@ -64,31 +96,32 @@ class SymbolicModel:
             {"tf": self.dt},
         )
         # Observation model.
-        self.g_func = cs.Function("g", [self.x_sym, self.u_sym], [self.y_sym], ["x", "u"], ["g"])
+        self.g_func = self._function("g", [self.x_sym, self.u_sym], [self.y_sym], ["x", "u"], ["g"])
 
     def setup_linearization(self):
         """Exposes functions for the linearized model."""
         # Jacobians w.r.t state & input.
         self.dfdx = cs.jacobian(self.x_dot, self.x_sym)
         self.dfdu = cs.jacobian(self.x_dot, self.u_sym)
-        self.df_func = cs.Function(
+        self.df_func = self._function(
             "df", [self.x_sym, self.u_sym], [self.dfdx, self.dfdu], ["x", "u"], ["dfdx", "dfdu"]
         )
         self.dgdx = cs.jacobian(self.y_sym, self.x_sym)
         self.dgdu = cs.jacobian(self.y_sym, self.u_sym)
-        self.dg_func = cs.Function(
+        self.dg_func = self._function(
             "dg", [self.x_sym, self.u_sym], [self.dgdx, self.dgdu], ["x", "u"], ["dgdx", "dgdu"]
         )
-        # Evaluation point for linearization.
-        self.x_eval = cs.MX.sym("x_eval", self.nx, 1)
-        self.u_eval = cs.MX.sym("u_eval", self.nu, 1)
+        # Evaluation point for linearization, of the same symbolic type (SX or MX) as the model.
+        sym_type = cs.SX if isinstance(self.x_sym, cs.SX) else cs.MX
+        self.x_eval = sym_type.sym("x_eval", self.nx, 1)
+        self.u_eval = sym_type.sym("u_eval", self.nu, 1)
         # Linearized dynamics model.
         self.x_dot_linear = (
             self.x_dot
             + self.dfdx @ (self.x_eval - self.x_sym)
             + self.dfdu @ (self.u_eval - self.u_sym)
         )
-        self.fc_linear_func = cs.Function(
+        self.fc_linear_func = self._function(
             "fc",
             [self.x_eval, self.u_eval, self.x_sym, self.u_sym],
             [self.x_dot_linear],
@@ -111,7 +144,7 @@ class SymbolicModel:
             + self.dgdx @ (self.x_eval - self.x_sym)
             + self.dgdu @ (self.u_eval - self.u_sym)
         )
-        self.g_linear_func = cs.Function(
+        self.g_linear_func = self._function(
             "g_linear",
             [self.x_eval, self.u_eval, self.x_sym, self.u_sym],
             [self.y_linear],
@@ -128,4 +161,40 @@ class SymbolicModel:
         l_inputs_str = ["x", "u", "Xr", "Ur", "Q", "R"]
         l_outputs = [self.cost_func, self.l_x, self.l_xx, self.l_u, self.l_uu, self.l_xu]
         l_outputs_str = ["l", "l_x", "l_xx", "l_u", "l_uu", "l_xu"]
-        self.loss = cs.Function("loss", l_inputs, l_outputs, l_inputs_str, l_outputs_str)
+        self.loss = self._function("loss", l_inputs, l_outputs, l_inputs_str, l_outputs_str)
+
+    def _function(self, name, inputs, outputs, input_names, output_names):
+        """Creates a CasADi function with `func_opts`.
+
+        Jit compiled functions are compiled once into a shared library in `cache_dir`, if given,
+        and loaded from there as external functions. The library also contains the first and second
+        order derivatives, which the controllers need. The libraries are keyed by a hash of the
+        serialized expression graph, the options, and the host CPU (the binaries may use
+        `-march=native`), so a changed model or machine never reloads an incompatible binary.
+
+        """
+        if self.cache_dir is None or not self.func_opts.get("jit", False):
+            return cs.Function(name, inputs, outputs, input_names, output_names, self.func_opts)
+        jit_keys = ("jit", "compiler", "jit_options")
+        opts = {k: v for k, v in self.func_opts.items() if k not in jit_keys}
+        func = cs.Function(name, inputs, outputs, input_names, output_names, opts)
+        key = (func.serialize(), sorted(self.func_opts.items()), cs.__version__, _host_id())
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        path = os.path.join(self.cache_dir, f"{name}_{digest}.so")
+        if not os.path.isfile(path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Build in a temporary directory, concurrent processes might compile the same function.
+            with tempfile.TemporaryDirectory(dir=self.cache_dir) as tmp_dir:
+                tmp_dir = tmp_dir + os.sep
+                gen = cs.CodeGenerator(f"{name}.c", {"with_header": False})
+                jac = func.jacobian()
+                for f in (func, jac, jac.jacobian()):
+                    gen.add(f)
+                jit_opts = dict(self.func_opts.get("jit_options", {}))
+                jit_opts.update(directory=tmp_dir, cleanup=False)
+                importer = cs.Importer(
+                    gen.generate(tmp_dir), self.func_opts.get("compiler", "shell"), jit_opts
+                )
+                os.replace(importer.library(), path)
+                del importer
+        return cs.external(name, path)
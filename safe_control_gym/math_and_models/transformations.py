@@ -167,7 +167,8 @@ def csRotX(phi):
 
 def csRotXYZ(phi, theta, psi):
     """Rotation matrix from euller angles  following SDFormat http://sdformat.org/tutorials?tut=specify_pose&cat=specification&.
-    This represents the extrinsic X-Y-Z (or quivalently the intrinsic Z-Y-X (3-2-1)) euler angle rotation.
+    This represents the extrinsic X-Y-Z (or equivalently the intrinsic Z-Y-X (3-2-1)) euler angle
+    rotation.
 
     Args:
       phi: roll (or rotation about X).
@@ -183,7 +184,8 @@ def csRotXYZ(phi, theta, psi):
 
 def RotXYZ(phi, theta,psi):
     """Rotation matrix from euller angles  following SDFormat http://sdformat.org/tutorials?tut=specify_pose&cat=specification&.
-    This represents the extrinsic X-Y-Z (or quivalently the intrinsic Z-Y-X (3-2-1)) euler angle rotation.
+    This represents the extrinsic X-Y-Z (or equivalently the intrinsic Z-Y-X (3-2-1)) euler angle
+    rotation.
 
     Args:
       phi: roll (or rotation about X).
@@ -195,3 +197,26 @@ def RotXYZ(phi, theta,psi):
     """
     R = csRotXYZ(phi, theta, psi).toarray()
     return R
+
+def quaternion_from_euler(rpy):
+    """Quaternions from euler angles, vectorized over rows and matching p.getQuaternionFromEuler().
+    This represents the extrinsic X-Y-Z (or equivalently the intrinsic Z-Y-X (3-2-1)) euler angle
+    rotation.
+
+    Args:
+      rpy: array of shape (..., 3) of roll, pitch, yaw angles.
+
+    Returns:
+      q: array of shape (..., 4) of unit quaternions in PyBullet's (x, y, z, w) convention.
+    """
+    half_rpy = 0.5 * np.asarray(rpy, dtype=float)
+    cr, cp, cy = np.moveaxis(np.cos(half_rpy), -1, 0)
+    sr, sp, sy = np.moveaxis(np.sin(half_rpy), -1, 0)
+    q = np.stack([sr * cp * cy - cr * sp * sy,
+                  cr * sp * cy + sr * cp * sy,
+                  cr * cp * sy - sr * sp * cy,
+                  cr * cp * cy + sr * sp * sy], axis=-1)
+    # Normalized like Bullet, in the same order of operations.
+    qx, qy, qz, qw = np.moveaxis(q, -1, 0)
+    norm = np.sqrt(qx * qx + qy * qy + qz * qz + qw * qw)
+    return q / norm[..., None]
@@ -0,0 +1,15 @@
+import numpy as np
+import pybullet as p
+
+from safe_control_gym.math_and_models.transformations import quaternion_from_euler
+
+
+def test_quaternion_from_euler_matches_pybullet():
+    rng = np.random.default_rng(0)
+    rpy = rng.uniform(-np.pi, np.pi, size=(100, 3))
+    expected = np.array([p.getQuaternionFromEuler(angles) for angles in rpy])
+    assert np.array_equal(quaternion_from_euler(rpy), expected)
+    for angles in rpy[:10]:
+        q = quaternion_from_euler(angles)
+        assert q.shape == (4,)
+        assert np.array_equal(q, p.getQuaternionFromEuler(angles))
@@ -0,0 +1,134 @@
+import os
+import shutil
+
+import numpy as np
+import pybullet as p
+import pytest
+
+from safe_control_gym.envs.gym_pybullet_drones import quadrotor
+from safe_control_gym.utils.registration import make
+
+
+def make_quadrotor(**kwargs):
+    return make(
+        'quadrotor',
+        quad_type=3,
+        gui=False,
+        task_info={'stabilization_goal': [0, 0, 1], 'stabilization_goal_tolerance': 0.1},
+        gates=[[0, 0, 0, 0, 0, 0, 0]],
+        obstacles=[[1, 1, 0, 0, 0, 0]],
+        **kwargs,
+    )
+
+
+def test_symbolic_cache_same_params(monkeypatch):
+    monkeypatch.setattr(quadrotor, '_SYM_CACHE', {})
+    env_a = make_quadrotor()
+    env_b = make_quadrotor()
+    assert len(quadrotor._SYM_CACHE) == 1
+    assert env_a.symbolic.fc_func is env_b.symbolic.fc_func
+    assert env_a.symbolic.loss is env_b.symbolic.loss
+    env_a.close()
+    env_b.close()
+
+
+def test_symbolic_cache_different_params(monkeypatch):
+    monkeypatch.setattr(quadrotor, '_SYM_CACHE', {})
+    env_a = make_quadrotor(inertial_prop=[0.03, 1.4e-5, 1.4e-5, 2.2e-5])
+    env_b = make_quadrotor(inertial_prop=[0.05, 1.4e-5, 1.4e-5, 2.2e-5])
+    assert len(quadrotor._SYM_CACHE) == 2
+    assert env_a.symbolic.fc_func is not env_b.symbolic.fc_func
+    x, u = np.zeros(12), np.full(4, 0.1)
+    assert not np.allclose(env_a.symbolic.fc_func(x, u), env_b.symbolic.fc_func(x, u))
+    env_a.close()
+    env_b.close()
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason='requires a C compiler')
+def test_symbolic_jit_cache(monkeypatch, tmp_path):
+    cache_dir, cwd = tmp_path / 'cache', tmp_path / 'cwd'
+    cwd.mkdir()
+    monkeypatch.chdir(cwd)
+    monkeypatch.setattr(quadrotor, '_SYM_JIT_CACHE_DIR', str(cache_dir))
+    monkeypatch.setattr(quadrotor, '_SYM_CACHE', {})
+    make_quadrotor(symbolic_jit=True, cost='quadratic').close()
+    cached = {f: os.path.getmtime(cache_dir / f) for f in os.listdir(cache_dir)}
+    assert cached
+    # A new process (empty in-memory cache) loads the compiled functions instead of rebuilding.
+    monkeypatch.setattr(quadrotor, '_SYM_CACHE', {})
+    env_jit = make_quadrotor(symbolic_jit=True, cost='quadratic')
+    assert {f: os.path.getmtime(cache_dir / f) for f in os.listdir(cache_dir)} == cached
+    env = make_quadrotor(cost='quadratic')
+    x, u = np.linspace(-0.5, 0.5, 12), np.full(4, 0.1)
+    calls = [
+        ('fc_func', dict(x=x, u=u)),
+        ('fd_func', dict(x0=x, p=u)),
+        ('df_func', dict(x=x, u=u)),
+        ('loss', dict(x=x, u=u, Xr=np.zeros(12), Ur=np.zeros(4), Q=np.eye(12), R=np.eye(4))),
+    ]
+    for name, args in calls:
+        expected = getattr(env.symbolic, name)(**args)
+        actual = getattr(env_jit.symbolic, name)(**args)
+        for key in expected:
+            assert np.allclose(actual[key], expected[key])
+    assert os.listdir(cwd) == []
+    env_jit.close()
+    env.close()
+
+
+def test_render():
+    env = make_quadrotor()
+    env.reset()
+    # The frame rendered before the segmentation mask became optional.
+    _, _, rgb_ref, _, _ = p.getCameraImage(
+        width=env.RENDER_WIDTH,
+        height=env.RENDER_HEIGHT,
+        shadow=1,
+        viewMatrix=env.CAM_VIEW,
+        projectionMatrix=env.CAM_PRO,
+        renderer=p.ER_TINY_RENDERER,
+        flags=p.ER_SEGMENTATION_MASK_OBJECT_AND_LINKINDEX,
+        physicsClientId=env.PYB_CLIENT,
+    )
+    rgb_ref = np.reshape(rgb_ref, (env.RENDER_HEIGHT, env.RENDER_WIDTH, 4))
+    rgb = env.render()
+    assert rgb.shape == rgb_ref.shape == (env.RENDER_HEIGHT, env.RENDER_WIDTH, 4)
+    assert rgb.dtype == rgb_ref.dtype
+    assert np.array_equal(rgb, rgb_ref)
+    rgb, dep, seg = env.render(with_depth=True, with_seg=True)
+    assert np.array_equal(rgb, rgb_ref)
+    assert dep.shape == seg.shape == (env.RENDER_HEIGHT, env.RENDER_WIDTH)
+    assert len(np.unique(seg)) > 1
+    _, dep_only = env.render(with_depth=True)
+    assert np.array_equal(dep_only, dep)
+    _, seg_only = env.render(with_seg=True)
+    assert np.array_equal(seg_only, seg)
+    env.close()
+
+
+def test_init_state_array():
+    env = make_quadrotor(init_state=np.arange(12.0))
+    assert np.array_equal(env._init_nominal, np.arange(12.0))
+    env.close()
+    with pytest.raises(ValueError):
+        make_quadrotor(init_state=np.zeros(6))
+
+
+def test_task_info_without_goal_tolerance():
+    env = make(
+        'quadrotor',
+        quad_type=2,
+        gui=False,
+        task_info={'stabilization_goal': [0, 1]},
+        gates=[[0.5, -2.5, 0, 0, 0, -1.57, 0]],
+        obstacles=[[1.5, -2.5, 0, 0, 0, 0]],
+    )
+    env.reset()
+    env.step(env.U_GOAL)
+    env.close()
+
+
+def test_symbolic_jit_requires_jit_dir(monkeypatch):
+    monkeypatch.setattr(quadrotor, '_CASADI_HAS_JIT_DIR', False)
+    with pytest.raises(ValueError):
+        make_quadrotor(symbolic_jit=True)